@@ -5,10 +5,15 @@
  * Tracks which source files (synced emails and calendar events) have already
  * been processed by the extract-entities skill. The `check` command lists files
  * that are new or changed since their last recorded hash; `update` marks files
- * as processed by storing their current SHA-256 hash.
+ * as processed by storing their current content hash.
  *
  * State is persisted as a TSV file at
- * ~/.cache/fit/outpost/state/graph_processed (path<TAB>hash).
+ * ~/.cache/fit/outpost/state/graph_processed
+ * (path<TAB>size<TAB>mtimeNs<TAB>algo:hash). Files whose size and mtime match
+ * the recorded values are skipped without re-hashing. Change detection is not
+ * a security boundary, so the hash is BLAKE2b (fastest collision-resistant
+ * option in node:crypto); entries recorded under an older algorithm or format
+ * simply mismatch once and get re-processed.
  */
 
 if (process.argv.includes("-h") || process.argv.includes("--help")) {
@@ -19,21 +24,25 @@ Usage:
   node scripts/state.mjs update <path> [<path>…]  Mark files as processed
   node scripts/state.mjs -h|--help                 Show this help message
 
-State file: ~/.cache/fit/outpost/state/graph_processed (TSV: path<TAB>hash)`);
+State file: ~/.cache/fit/outpost/state/graph_processed
+(TSV: path<TAB>size<TAB>mtimeNs<TAB>algo:hash)`);
   process.exit(0);
 }
 
 import { createHash } from "node:crypto";
 import {
+  closeSync,
   existsSync,
   mkdirSync,
+  openSync,
   readFileSync,
+  readSync,
   readdirSync,
   statSync,
   writeFileSync,
 } from "node:fs";
 import { homedir } from "node:os";
-import { join } from "node:path";
+import { dirname, join } from "node:path";
 
 const HOME = homedir();
 const STATE_FILE = join(HOME, ".cache/fit/outpost/state/graph_processed");
@@ -43,89 +52,135 @@ const SOURCE_DIRS = [
   join(HOME, ".cache/fit/outpost/teams_chat"),
 ];
 
-/** Compute SHA-256 hash of a file. */
+const HASH_ALGO = "blake2b512";
+
+// Reused read buffer for hashing. Files are hashed one at a time, so a
+// single module-level buffer avoids allocating each file's full contents.
+const HASH_BUF = Buffer.allocUnsafe(64 * 1024);
+
+/** Compute an algo-tagged content hash of a file, streaming through a fixed-size buffer. */
 function fileHash(filePath) {
-  const data = readFileSync(filePath);
-  return createHash("sha256").update(data).digest("hex");
+  const hash = createHash(HASH_ALGO);
+  const fd = openSync(filePath, "r");
+  try {
+    let bytesRead;
+    while ((bytesRead = readSync(fd, HASH_BUF, 0, HASH_BUF.length, null)) > 0) {
+      hash.update(HASH_BUF.subarray(0, bytesRead));
+    }
+  } finally {
+    closeSync(fd);
+  }
+  return `${HASH_ALGO}:${hash.digest("hex")}`;
 }
 
-/** Load the state file into a Map of {path → hash}. */
-function loadState() {
+/** Load the state file into a Map of {path → {size, mtimeNs, hash}}. */
+function loadState(stateFile) {
   const state = new Map();
-  if (!existsSync(STATE_FILE)) return state;
-  const text = readFileSync(STATE_FILE, "utf-8");
+  if (!existsSync(stateFile)) return state;
+  const text = readFileSync(stateFile, "utf-8");
   for (const line of text.split("\n")) {
     if (!line) continue;
-    const idx = line.indexOf("\t");
-    if (idx === -1) continue;
-    state.set(line.slice(0, idx), line.slice(idx + 1));
+    const parts = line.split("\t");
+    if (parts.length >= 4) {
+      state.set(parts[0], {
+        size: parts[1],
+        mtimeNs: parts[2],
+        hash: parts[3],
+      });
+    } else if (parts.length === 2) {
+      // Legacy path<TAB>hash entry: no stat columns, so it never takes the
+      // stat shortcut and is rewritten in the new format on next update.
+      state.set(parts[0], { size: "", mtimeNs: "", hash: parts[1] });
+    }
   }
   return state;
 }
 
 /** Write the full state Map back to the state file. */
-function saveState(state) {
-  const dir = join(HOME, ".cache/fit/outpost/state");
-  mkdirSync(dir, { recursive: true });
+function saveState(state, stateFile) {
+  mkdirSync(dirname(stateFile), { recursive: true });
   const entries = [...state.entries()].sort((a, b) => a[0].localeCompare(b[0]));
   const text = entries.length
-    ? entries.map(([p, h]) => `${p}\t${h}`).join("\n") + "\n"
+    ? entries
+        .map(([p, e]) => `${p}\t${e.size}\t${e.mtimeNs}\t${e.hash}`)
+        .join("\n") + "\n"
     : "";
-  writeFileSync(STATE_FILE, text);
+  writeFileSync(stateFile, text);
 }
 
-/** Find source files that are new or have changed since last processing. */
-function check() {
-  const state = loadState();
+/**
+ * Find source files that are new or have changed since last processing.
+ * Returns the sorted list of paths to process. `sourceDirs` and `stateFile`
+ * default to the module-level locations; tests inject temp paths.
+ */
+export function check(sourceDirs = SOURCE_DIRS, stateFile = STATE_FILE) {
+  const state = loadState(stateFile);
   const newFiles = [];
-  for (const dir of SOURCE_DIRS) {
+  for (const dir of sourceDirs) {
     if (!existsSync(dir)) continue;
-    for (const name of readdirSync(dir)) {
-      const filePath = join(dir, name);
-      const stat = statSync(filePath, { throwIfNoEntry: false });
-      if (!stat || !stat.isFile()) continue;
-      const h = fileHash(filePath);
-      if (state.get(filePath) !== h) {
+    for (const entry of readdirSync(dir, { withFileTypes: true })) {
+      if (!entry.isFile()) continue; // Type comes from the directory read — no stat needed
+      const filePath = join(dir, entry.name);
+      const stat = statSync(filePath, { bigint: true, throwIfNoEntry: false });
+      if (!stat) continue;
+      const prev = state.get(filePath);
+      if (
+        prev &&
+        prev.size === String(stat.size) &&
+        prev.mtimeNs === String(stat.mtimeNs)
+      ) {
+        continue; // Unchanged since last update — skip hashing
+      }
+      if (!prev || prev.hash !== fileHash(filePath)) {
         newFiles.push(filePath);
       }
     }
   }
   newFiles.sort();
-  for (const f of newFiles) {
-    console.log(f);
-  }
-  return newFiles.length;
+  return newFiles;
 }
 
 /** Mark files as processed by updating their hashes in state. */
-function update(filePaths) {
-  const state = loadState();
+export function update(filePaths, stateFile = STATE_FILE) {
+  const state = loadState(stateFile);
   for (const fp of filePaths) {
-    if (!existsSync(fp)) {
+    const stat = statSync(fp, { bigint: true, throwIfNoEntry: false });
+    if (!stat || !stat.isFile()) {
       console.error(`Warning: File not found: ${fp}`);
       continue;
     }
-    state.set(fp, fileHash(fp));
+    state.set(fp, {
+      size: String(stat.size),
+      mtimeNs: String(stat.mtimeNs),
+      hash: fileHash(fp),
+    });
   }
-  saveState(state);
-  console.log(`Updated ${filePaths.length} file(s) in graph state`);
+  saveState(state, stateFile);
 }
 
 // --- CLI ---
+if (
+  process.argv[1] &&
+  (process.argv[1].endsWith("state.mjs") || process.argv[1].endsWith("state"))
+) {
+  const args = process.argv.slice(2);
+  const cmd = args[0];
 
-const args = process.argv.slice(2);
-const cmd = args[0];
-
-if (cmd === "check") {
-  const count = check();
-  console.error(`\n${count} file(s) to process`);
-} else if (cmd === "update" && args.length >= 2) {
-  update(args.slice(1));
-} else {
-  console.error(
-    "Usage:\n" +
-      "  node scripts/state.mjs check\n" +
-      "  node scripts/state.mjs update <file-path> [<file-path> …]",
-  );
-  process.exit(1);
+  if (cmd === "check") {
+    const files = check();
+    for (const f of files) {
+      console.log(f);
+    }
+    console.error(`\n${files.length} file(s) to process`);
+  } else if (cmd === "update" && args.length >= 2) {
+    update(args.slice(1));
+    console.log(`Updated ${args.length - 1} file(s) in graph state`);
+  } else {
+    console.error(
+      "Usage:\n" +
+        "  node scripts/state.mjs check\n" +
+        "  node scripts/state.mjs update <file-path> [<file-path> …]",
+    );
+    process.exit(1);
+  }
 }
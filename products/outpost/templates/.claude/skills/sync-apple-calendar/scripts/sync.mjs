@@ -27,7 +27,9 @@ import { DatabaseSync } from "node:sqlite";
 import {
   existsSync,
   mkdirSync,
+  readFileSync,
   readdirSync,
+  renameSync,
   unlinkSync,
   writeFileSync,
 } from "node:fs";
@@ -81,6 +83,24 @@ function findDb() {
   return db;
 }
 
+/**
+ * Apply read-only tuning to a fresh connection: larger page cache, mmap I/O
+ * for already-cached pages, in-memory temp spill. Best-effort — defaults
+ * still work if a PRAGMA is rejected.
+ * @param {import("node:sqlite").DatabaseSync} db
+ * @returns {import("node:sqlite").DatabaseSync}
+ */
+function tuneDb(db) {
+  try {
+    db.exec(
+      "PRAGMA cache_size=-262144; PRAGMA mmap_size=1073741824; PRAGMA temp_store=MEMORY;",
+    );
+  } catch {
+    // Keep defaults
+  }
+  return db;
+}
+
 /**
  * Open the database in read-only mode with retry on lock.
  * @param {string} dbPath
@@ -88,35 +108,90 @@ function findDb() {
  */
 function openDb(dbPath) {
   try {
-    return new DatabaseSync(dbPath, { readOnly: true });
+    return tuneDb(new DatabaseSync(dbPath, { readOnly: true }));
   } catch (err) {
     if (err.message.includes("locked")) {
       Atomics.wait(new Int32Array(new SharedArrayBuffer(4)), 0, 0, 2000);
-      return new DatabaseSync(dbPath, { readOnly: true });
+      return tuneDb(new DatabaseSync(dbPath, { readOnly: true }));
     }
     throw err;
   }
 }
 
+// Prepared-statement cache per connection: repeated SQL text (the chunked
+// attendee fetches) binds into an already-planned statement instead of
+// re-parsing.
+const stmtCache = new WeakMap();
+
+function prepareCached(db, sql) {
+  let statements = stmtCache.get(db);
+  if (!statements) {
+    statements = new Map();
+    stmtCache.set(db, statements);
+  }
+  let stmt = statements.get(sql);
+  if (!stmt) {
+    stmt = db.prepare(sql);
+    statements.set(sql, stmt);
+  }
+  return stmt;
+}
+
 /**
  * Execute a read-only query and return results.
  * @param {import("node:sqlite").DatabaseSync} db
  * @param {string} sql
+ * @param {Array<string | number>} [params]
  * @returns {Array<Record<string, any>>}
  */
-function query(db, sql) {
+function query(db, sql, params = []) {
   try {
-    return db.prepare(sql).all();
+    return prepareCached(db, sql).all(...params);
   } catch (err) {
     console.error(`SQLite error: ${err.message}`);
     return [];
   }
 }
 
+// Intl.DateTimeFormat construction parses locale and tzdata and costs far
+// more than a format call. A sync window rarely spans more than a handful of
+// timezones, so cache one formatter pair per zone for the run.
+const tzFormatters = new Map();
+
+/**
+ * Get (or build and cache) the timestamp/offset formatters for a timezone.
+ * Throws like the Intl constructors do for unknown timezone names.
+ * @param {string} tzName
+ * @returns {{ stamp: Intl.DateTimeFormat, offset: Intl.DateTimeFormat }}
+ */
+function getTzFormatters(tzName) {
+  let formatters = tzFormatters.get(tzName);
+  if (!formatters) {
+    formatters = {
+      stamp: new Intl.DateTimeFormat("sv-SE", {
+        timeZone: tzName,
+        year: "numeric",
+        month: "2-digit",
+        day: "2-digit",
+        hour: "2-digit",
+        minute: "2-digit",
+        second: "2-digit",
+        hour12: false,
+      }),
+      offset: new Intl.DateTimeFormat("en-US", {
+        timeZone: tzName,
+        timeZoneName: "longOffset",
+      }),
+    };
+    tzFormatters.set(tzName, formatters);
+  }
+  return formatters;
+}
+
 /**
  * Convert Core Data timestamp to ISO 8601.
  * @param {number | null} ts - Seconds since 2001-01-01
- * @param {string | null} tzName
+ * @param {string | null} tzName - Normalized timezone (callers map "_float" to null)
  * @returns {string | null}
  */
 function coredataToIso(ts, tzName) {
@@ -124,12 +199,10 @@ function coredataToIso(ts, tzName) {
   const ms = EPOCH_MS + ts * 1000;
   const dt = new Date(ms);
 
-  if (tzName && tzName !== "_float") {
+  if (tzName) {
     try {
-      return (
-        dt.toLocaleString("sv-SE", { timeZone: tzName }).replace(" ", "T") +
-        getUtcOffset(dt, tzName)
-      );
+      const { stamp, offset } = getTzFormatters(tzName);
+      return stamp.format(dt).replace(" ", "T") + getUtcOffset(dt, offset);
     } catch {
       // Fall through to UTC
     }
@@ -140,15 +213,12 @@ function coredataToIso(ts, tzName) {
 /**
  * Get UTC offset string for a timezone at a given instant.
  * @param {Date} dt
- * @param {string} tzName
+ * @param {Intl.DateTimeFormat} offsetFormat - Cached longOffset formatter
  * @returns {string} e.g. "+02:00" or "-05:00"
  */
-function getUtcOffset(dt, tzName) {
+function getUtcOffset(dt, offsetFormat) {
   try {
-    const parts = new Intl.DateTimeFormat("en-US", {
-      timeZone: tzName,
-      timeZoneName: "longOffset",
-    }).formatToParts(dt);
+    const parts = offsetFormat.formatToParts(dt);
     const tzPart = parts.find((p) => p.type === "timeZoneName");
     if (tzPart) {
       // "GMT+2" → "+02:00", "GMT-5:30" → "-05:30", "GMT" → "+00:00"
@@ -192,32 +262,38 @@ function fetchEvents(db, startTs, endTs) {
     LEFT JOIN Location loc ON loc.ROWID = ci.location_id
     LEFT JOIN Calendar cal ON cal.ROWID = ci.calendar_id
     LEFT JOIN Identity org ON org.ROWID = ci.organizer_id
-    WHERE ci.start_date <= ${endTs}
-      AND COALESCE(ci.end_date, ci.start_date) >= ${startTs}
+    WHERE ci.start_date <= ?
+      AND COALESCE(ci.end_date, ci.start_date) >= ?
       AND ci.summary IS NOT NULL
       AND ci.summary != ''
     ORDER BY ci.start_date ASC
     LIMIT 1000;
   `,
+    [endTs, startTs],
   );
 }
 
 function fetchAttendeesByEvent(db, eventIds) {
   const attendeesByEvent = {};
-  if (eventIds.length === 0) return attendeesByEvent;
-  const idList = eventIds.join(",");
-  const attendeesRaw = query(
-    db,
-    `
+  // Chunk the IN list: the event window can exceed the 999 bound-parameter
+  // cap of older SQLite builds.
+  for (let i = 0; i < eventIds.length; i += 900) {
+    const chunk = eventIds.slice(i, i + 900);
+    const placeholders = chunk.map(() => "?").join(",");
+    const attendeesRaw = query(
+      db,
+      `
     SELECT p.owner_id, p.email, p.status, p.role, p.is_self, p.entity_type, i.display_name
     FROM Participant p
     LEFT JOIN Identity i ON i.ROWID = p.identity_id
-    WHERE p.owner_id IN (${idList}) AND p.entity_type = 7;
+    WHERE p.owner_id IN (${placeholders}) AND p.entity_type = 7;
   `,
-  );
-  for (const a of attendeesRaw) {
-    attendeesByEvent[a.owner_id] ??= [];
-    attendeesByEvent[a.owner_id].push(a);
+      chunk,
+    );
+    for (const a of attendeesRaw) {
+      attendeesByEvent[a.owner_id] ??= [];
+      attendeesByEvent[a.owner_id].push(a);
+    }
   }
   return attendeesByEvent;
 }
@@ -249,16 +325,20 @@ function tzOrNull(tz) {
 }
 
 function buildEventJson(ev, attendeesByEvent) {
+  // Normalize the sentinel "_float" to null once; both the dateTime and
+  // timeZone fields below consume the same derived value.
+  const startTz = tzOrNull(ev.start_tz);
+  const endTz = tzOrNull(ev.end_tz);
   return {
     id: `apple_cal_${ev.id}`,
     summary: ev.summary,
     start: {
-      dateTime: coredataToIso(ev.start_date, ev.start_tz),
-      timeZone: tzOrNull(ev.start_tz),
+      dateTime: coredataToIso(ev.start_date, startTz),
+      timeZone: startTz,
     },
     end: {
-      dateTime: coredataToIso(ev.end_date ?? ev.start_date, ev.end_tz),
-      timeZone: tzOrNull(ev.end_tz),
+      dateTime: coredataToIso(ev.end_date ?? ev.start_date, endTz),
+      timeZone: endTz,
     },
     allDay: Boolean(ev.all_day),
     location: ev.location || null,
@@ -272,19 +352,39 @@ function buildEventJson(ev, attendeesByEvent) {
 
 function writeEventFiles(events, attendeesByEvent) {
   const writtenIds = new Set();
+  let unchanged = 0;
   for (const ev of events) {
     const eventJson = buildEventJson(ev, attendeesByEvent);
     const filename = `${ev.id}.json`;
-    writeFileSync(join(OUTDIR, filename), JSON.stringify(eventJson, null, 2));
+    const data = JSON.stringify(eventJson, null, 2);
+    const outPath = join(OUTDIR, filename);
     writtenIds.add(filename);
+    // Skip the write when the serialized event is identical to what's on
+    // disk — keeps mtimes stable so downstream change detection stays quiet.
+    try {
+      if (readFileSync(outPath, "utf-8") === data) {
+        unchanged++;
+        continue;
+      }
+    } catch {
+      // New file
+    }
+    // Write-then-rename so agents reading the cache mid-sync never parse
+    // a half-written event file.
+    const tmpPath = `${outPath}.tmp`;
+    writeFileSync(tmpPath, data);
+    renameSync(tmpPath, outPath);
   }
-  return writtenIds;
+  return { writtenIds, unchanged };
 }
 
 function cleanupStaleFiles(writtenIds) {
   let removed = 0;
   for (const fname of readdirSync(OUTDIR)) {
-    if (fname.endsWith(".json") && !writtenIds.has(fname)) {
+    const stale =
+      (fname.endsWith(".json") && !writtenIds.has(fname)) ||
+      fname.endsWith(".json.tmp"); // leftover from an interrupted sync
+    if (stale) {
       unlinkSync(join(OUTDIR, fname));
       removed++;
     }
@@ -314,11 +414,11 @@ function main() {
     const events = fetchEvents(db, startTs, endTs);
     const eventIds = events.map((ev) => String(ev.id));
     const attendeesByEvent = fetchAttendeesByEvent(db, eventIds);
-    const writtenIds = writeEventFiles(events, attendeesByEvent);
+    const { writtenIds, unchanged } = writeEventFiles(events, attendeesByEvent);
     const removed = cleanupStaleFiles(writtenIds);
 
     console.log("Apple Calendar Sync Complete");
-    console.log(`Events synced: ${writtenIds.size}`);
+    console.log(`Events synced: ${writtenIds.size} (${unchanged} unchanged)`);
     console.log(
       `Time window: ${start.toISOString().slice(0, 10)} to ${end.toISOString().slice(0, 10)}`,
     );
@@ -20,7 +20,19 @@ body to stdout. Falls back to stripping HTML tags for HTML-only emails.`);
   process.exit(0);
 }
 
-import { readFileSync } from "node:fs";
+import { closeSync, openSync, readSync, statSync } from "node:fs";
+
+// HTML-cleaning patterns, hoisted so hot email parsing reuses one compiled
+// regex per pattern instead of materializing them on every htmlToText call.
+const STYLE_SCRIPT_RE = /<(style|script)[^>]*>[\s\S]*?<\/\1>/gi;
+const COMMENT_RE = /<!--[\s\S]*?-->/g;
+const CDATA_RE = /<!\[CDATA\[[\s\S]*?\]\]>/g;
+const BR_RE = /<br\s*\/?>/gi;
+const P_CLOSE_RE = /<\/p>/gi;
+const TAG_RE = /<[^>]+>/g;
+const SPACES_RE = /[ \t]+/g;
+const BLANK_LINES_RE = /\n{3,}/g;
+const ENTITY_RE = /&(#x?[0-9a-fA-F]+|[a-zA-Z]+);/g;
 
 /**
  * Strip HTML tags and convert to plain text.
@@ -29,53 +41,56 @@ import { readFileSync } from "node:fs";
  */
 export function htmlToText(html) {
   let text = html;
-  // Remove style and script blocks
-  text = text.replace(/<(style|script)[^>]*>[\s\S]*?<\/\1>/gi, "");
+  // Remove style and script blocks, comments, and CDATA sections
+  text = text.replace(STYLE_SCRIPT_RE, "");
+  text = text.replace(COMMENT_RE, "");
+  text = text.replace(CDATA_RE, "");
   // Replace br and p tags with newlines
-  text = text.replace(/<br\s*\/?>/gi, "\n");
-  text = text.replace(/<\/p>/gi, "\n");
+  text = text.replace(BR_RE, "\n");
+  text = text.replace(P_CLOSE_RE, "\n");
   // Strip remaining tags
-  text = text.replace(/<[^>]+>/g, "");
+  text = text.replace(TAG_RE, "");
   // Decode common HTML entities
   text = decodeEntities(text);
   // Collapse whitespace
-  text = text.replace(/[ \t]+/g, " ");
-  text = text.replace(/\n{3,}/g, "\n\n");
+  text = text.replace(SPACES_RE, " ");
+  text = text.replace(BLANK_LINES_RE, "\n\n");
   return text.trim();
 }
 
+const NAMED_ENTITIES = {
+  amp: "&",
+  lt: "<",
+  gt: ">",
+  quot: '"',
+  apos: "'",
+  nbsp: " ",
+  ndash: "–",
+  mdash: "—",
+  lsquo: "\u2018",
+  rsquo: "\u2019",
+  ldquo: "\u201C",
+  rdquo: "\u201D",
+  hellip: "…",
+  copy: "©",
+  reg: "®",
+  trade: "™",
+  bull: "•",
+  middot: "·",
+  ensp: "\u2002",
+  emsp: "\u2003",
+  thinsp: "\u2009",
+  zwnj: "\u200C",
+  zwj: "\u200D",
+};
+
 /**
  * Decode HTML entities. Handles named entities and numeric references.
  * @param {string} text
  * @returns {string}
  */
 function decodeEntities(text) {
-  const named = {
-    amp: "&",
-    lt: "<",
-    gt: ">",
-    quot: '"',
-    apos: "'",
-    nbsp: " ",
-    ndash: "–",
-    mdash: "—",
-    lsquo: "\u2018",
-    rsquo: "\u2019",
-    ldquo: "\u201C",
-    rdquo: "\u201D",
-    hellip: "…",
-    copy: "©",
-    reg: "®",
-    trade: "™",
-    bull: "•",
-    middot: "·",
-    ensp: "\u2002",
-    emsp: "\u2003",
-    thinsp: "\u2009",
-    zwnj: "\u200C",
-    zwj: "\u200D",
-  };
-  return text.replace(/&(#x?[0-9a-fA-F]+|[a-zA-Z]+);/g, (match, ref) => {
+  return text.replace(ENTITY_RE, (match, ref) => {
     if (ref.startsWith("#x") || ref.startsWith("#X")) {
       const code = parseInt(ref.slice(2), 16);
       return code ? String.fromCodePoint(code) : match;
@@ -84,7 +99,7 @@ function decodeEntities(text) {
       const code = parseInt(ref.slice(1), 10);
       return code ? String.fromCodePoint(code) : match;
     }
-    return named[ref.toLowerCase()] ?? match;
+    return NAMED_ENTITIES[ref.toLowerCase()] ?? match;
   });
 }
 
@@ -233,26 +248,36 @@ function decodeText(data, charset) {
 }
 
 /**
- * Parse a MIME part from raw bytes. Returns { contentType, charset, body }.
+ * Parse a MIME part from raw bytes. The payload stays undecoded — callers
+ * run decodePart() on the parts they actually consume, so base64 attachment
+ * payloads are never decoded just to be discarded.
  * @param {Buffer} raw
- * @returns {{ contentType: string, charset: string, body: Buffer, headers: Map<string, string[]> }}
+ * @returns {{ contentType: string, charset: string, encoding: string, bodyRaw: Buffer, headers: Map<string, string[]>, boundary: string | undefined }}
  */
 function parsePart(raw) {
   const { headers, bodyOffset } = parseHeaders(raw);
   const ctHeader = (headers.get("content-type") ?? ["text/plain"])[0];
   const { type, params } = parseContentType(ctHeader);
   const encoding = (headers.get("content-transfer-encoding") ?? ["7bit"])[0];
-  const bodyRaw = raw.subarray(bodyOffset);
-  const body = decodePayload(bodyRaw, encoding);
   return {
     contentType: type,
     charset: params.charset,
-    body,
+    encoding,
+    bodyRaw: raw.subarray(bodyOffset),
     headers,
     boundary: params.boundary,
   };
 }
 
+/**
+ * Decode a part's transfer encoding and charset into text.
+ * @param {{ bodyRaw: Buffer, encoding: string, charset: string }} part
+ * @returns {string}
+ */
+function decodePart(part) {
+  return decodeText(decodePayload(part.bodyRaw, part.encoding), part.charset);
+}
+
 /**
  * Walk all MIME parts of a message (like Python's email.walk()).
  * @param {Buffer} raw
@@ -289,7 +314,9 @@ function extractNextPart(raw, delim, pos) {
 function walkParts(raw) {
   const part = parsePart(raw);
   if (!part.contentType.startsWith("multipart/")) {
-    return [part];
+    // Only text leaves can become a body; dropping attachment and image
+    // parts here keeps them out of every downstream scan.
+    return part.contentType.startsWith("text/") ? [part] : [];
   }
 
   const boundary = part.boundary;
@@ -319,34 +346,86 @@ function walkParts(raw) {
  */
 export function extractBody(raw) {
   const parts = walkParts(raw);
-  let textBody = null;
-  let htmlBody = null;
+  let plainPart = null;
+  let htmlPart = null;
 
   for (const part of parts) {
-    if (part.contentType === "text/plain" && textBody === null) {
-      textBody = decodeText(part.body, part.charset);
-    } else if (part.contentType === "text/html" && htmlBody === null) {
-      htmlBody = decodeText(part.body, part.charset);
+    if (part.contentType === "text/plain" && plainPart === null) {
+      plainPart = part;
+    } else if (part.contentType === "text/html" && htmlPart === null) {
+      htmlPart = part;
     }
+    if (plainPart && htmlPart) break;
   }
 
-  if (textBody) return textBody;
-  if (htmlBody) return htmlToText(htmlBody);
+  if (plainPart) {
+    const textBody = decodePart(plainPart);
+    if (textBody) return textBody;
+  }
+  if (htmlPart) {
+    const htmlBody = decodePart(htmlPart);
+    if (htmlBody) return htmlToText(htmlBody);
+  }
   return null;
 }
 
 /**
- * Parse an .emlx file and return the body text.
+ * Read the RFC822 portion of an .emlx file. The first line carries the
+ * message byte count and an Apple plist follows the message, so reading
+ * exactly the counted range skips the trailer instead of loading the
+ * whole file and slicing it.
+ * @param {string} filePath
+ * @returns {Buffer}
+ */
+function readMessage(filePath) {
+  const fd = openSync(filePath, "r");
+  try {
+    // The byte-count line is tiny; 32 bytes covers any realistic count.
+    const head = Buffer.allocUnsafe(32);
+    const headLen = readSync(fd, head, 0, head.length, 0);
+    const newline = head.subarray(0, headLen).indexOf(0x0a);
+    if (newline === -1) return Buffer.alloc(0);
+    const byteCount = parseInt(head.subarray(0, newline).toString("ascii"), 10);
+    if (!(byteCount > 0)) return Buffer.alloc(0);
+    const raw = Buffer.allocUnsafe(byteCount);
+    const start = newline + 1;
+    let offset = 0;
+    let n;
+    while (
+      offset < byteCount &&
+      (n = readSync(fd, raw, offset, byteCount - offset, start + offset)) > 0
+    ) {
+      offset += n;
+    }
+    // A truncated file yields a short (but still parseable) message
+    return offset === byteCount ? raw : raw.subarray(0, offset);
+  } finally {
+    closeSync(fd);
+  }
+}
+
+// Body cache keyed by path + mtime. The emlx index can point several message
+// IDs at the same file, and long threads revisit messages across syncs in
+// one run; the mtime in the key means a file Mail rewrites mid-run is
+// re-parsed instead of served stale. Evict oldest-first to stay bounded.
+const BODY_CACHE_MAX = 4096;
+const bodyCache = new Map();
+
+/**
+ * Parse an .emlx file and return the body text. Results are memoized per
+ * path and mtime for the lifetime of the process.
  * @param {string} filePath
  * @returns {string | null}
  */
 export function parseEmlx(filePath) {
-  const data = readFileSync(filePath);
-  // First line is the byte count
-  const newline = data.indexOf(0x0a);
-  const byteCount = parseInt(data.subarray(0, newline).toString("ascii"), 10);
-  const raw = data.subarray(newline + 1, newline + 1 + byteCount);
-  return extractBody(raw);
+  const cacheKey = `${filePath}:${statSync(filePath).mtimeMs}`;
+  if (bodyCache.has(cacheKey)) return bodyCache.get(cacheKey);
+  const body = extractBody(readMessage(filePath));
+  if (bodyCache.size >= BODY_CACHE_MAX) {
+    bodyCache.delete(bodyCache.keys().next().value);
+  }
+  bodyCache.set(cacheKey, body);
+  return body;
 }
 
 /**
@@ -354,10 +433,7 @@ export function parseEmlx(filePath) {
  * @param {string} filePath
  */
 function parseAndPrint(filePath) {
-  const data = readFileSync(filePath);
-  const newline = data.indexOf(0x0a);
-  const byteCount = parseInt(data.subarray(0, newline).toString("ascii"), 10);
-  const raw = data.subarray(newline + 1, newline + 1 + byteCount);
+  const raw = readMessage(filePath);
   const { headers } = parseHeaders(raw);
 
   const from = (headers.get("from") ?? ["Unknown"])[0];
@@ -1,9 +1,10 @@
-import { execFileSync } from "node:child_process";
 import {
+  constants,
   copyFileSync,
-  existsSync,
   mkdirSync,
   readFileSync,
+  readdirSync,
+  renameSync,
   writeFileSync,
 } from "node:fs";
 import { createRequire } from "node:module";
@@ -37,24 +38,60 @@ export function findDb() {
   return paths[0];
 }
 
+/**
+ * Apply read-only tuning to a fresh connection: a ~256 MB page cache keeps
+ * the join-heavy working set warm across the run's queries, mmap serves
+ * already-cached pages without read() syscalls, and temp spill stays in RAM.
+ * Best-effort — defaults still work if a PRAGMA is rejected.
+ */
+function tuneDb(db) {
+  try {
+    db.exec(
+      "PRAGMA cache_size=-262144; PRAGMA mmap_size=1073741824; PRAGMA temp_store=MEMORY;",
+    );
+  } catch {
+    // Keep defaults
+  }
+  return db;
+}
+
 /** Open a read-only SQLite connection, retrying once if the database is locked. */
 export function openDb(dbPath) {
   const { DatabaseSync } = requireModule("node:sqlite");
   try {
-    return new DatabaseSync(dbPath, { readOnly: true });
+    return tuneDb(new DatabaseSync(dbPath, { readOnly: true }));
   } catch (err) {
     if (err.message.includes("locked")) {
       Atomics.wait(new Int32Array(new SharedArrayBuffer(4)), 0, 0, 2000);
-      return new DatabaseSync(dbPath, { readOnly: true });
+      return tuneDb(new DatabaseSync(dbPath, { readOnly: true }));
     }
     throw err;
   }
 }
 
+// Prepared-statement cache per connection. The same SQL text runs many times
+// per sync (fixed statements plus per-chunk IN lists of identical arity), and
+// each prepare() re-parses and re-plans; caching makes repeats a bind+step.
+const stmtCache = new WeakMap();
+
+function prepareCached(db, sql) {
+  let statements = stmtCache.get(db);
+  if (!statements) {
+    statements = new Map();
+    stmtCache.set(db, statements);
+  }
+  let stmt = statements.get(sql);
+  if (!stmt) {
+    stmt = db.prepare(sql);
+    statements.set(sql, stmt);
+  }
+  return stmt;
+}
+
 /** Execute a SQL query and return all rows, logging errors and returning an empty array on failure. */
-export function query(db, sql) {
+export function query(db, sql, params = []) {
   try {
-    return db.prepare(sql).all();
+    return prepareCached(db, sql).all(...params);
   } catch (err) {
     console.error(`SQLite error: ${err.message}`);
     return [];
@@ -95,17 +132,36 @@ export function loadLastRowid() {
   return 0;
 }
 
+// Bounded memo for formatted dates. Threads repeat timestamps (same-second
+// bursts, re-rendered threads), so formatting each distinct value once is
+// enough; evict oldest-first to stay bounded.
+const DATE_MEMO_MAX = 8192;
+const dateMemo = new Map();
+
+/** Pad a date component to two digits. */
+function pad2(n) {
+  return n < 10 ? `0${n}` : String(n);
+}
+
 /** Convert a Unix timestamp in seconds to a human-readable UTC date string. */
 export function unixToReadable(ts) {
   if (ts == null) return "Unknown";
-  try {
-    return new Date(ts * 1000)
-      .toISOString()
-      .replace("T", " ")
-      .replace(/\.\d+Z/, " UTC");
-  } catch {
-    return "Unknown";
+  const memoized = dateMemo.get(ts);
+  if (memoized !== undefined) return memoized;
+  // Format "YYYY-MM-DD HH:MM:SS UTC" from the UTC components directly —
+  // building via toISOString() plus string surgery costs two extra string
+  // passes (one of them a regex) per formatted date.
+  const d = new Date(ts * 1000);
+  const time = d.getTime();
+  const readable = Number.isNaN(time)
+    ? "Unknown"
+    : `${String(d.getUTCFullYear()).padStart(4, "0")}-${pad2(d.getUTCMonth() + 1)}-${pad2(d.getUTCDate())} ` +
+      `${pad2(d.getUTCHours())}:${pad2(d.getUTCMinutes())}:${pad2(d.getUTCSeconds())} UTC`;
+  if (dateMemo.size >= DATE_MEMO_MAX) {
+    dateMemo.delete(dateMemo.keys().next().value);
   }
+  dateMemo.set(ts, readable);
+  return readable;
 }
 
 /** Detect whether the messages table uses conversation_id or thread_id for threading. */
@@ -124,7 +180,7 @@ export function findChangedThreads(db, threadCol, sinceTs, lastRowid) {
     `
     SELECT DISTINCT m.${threadCol} AS tid
     FROM messages m
-    WHERE (m.date_received > ${sinceTs} OR m.ROWID > ${lastRowid})
+    WHERE (m.date_received > ? OR m.ROWID > ?)
       AND m.deleted = 0
       AND m.mailbox IN (
         SELECT ROWID FROM mailboxes
@@ -132,14 +188,18 @@ export function findChangedThreads(db, threadCol, sinceTs, lastRowid) {
            OR url LIKE '%/INBOX%'
            OR url LIKE '%/Sent%'
       )
-    LIMIT ${MAX_THREADS};
+    LIMIT ?;
   `,
+    [sinceTs, lastRowid, MAX_THREADS],
   );
 }
 
-/** Fetch all messages in a thread ordered by date, including sender and summary metadata. */
-export function fetchThreadMessages(db, threadCol, tid) {
-  return query(
+/** Fetch all messages for the given thread IDs in one query, grouped by thread and ordered by date. */
+export function fetchAllThreadMessages(db, threadCol, tids) {
+  const messagesByThread = new Map();
+  if (tids.length === 0) return messagesByThread;
+  const placeholders = tids.map(() => "?").join(",");
+  const rows = query(
     db,
     `
     SELECT
@@ -157,20 +217,42 @@ export function fetchThreadMessages(db, threadCol, tid) {
     LEFT JOIN subjects s ON m.subject = s.ROWID
     LEFT JOIN addresses a ON m.sender = a.ROWID
     LEFT JOIN summaries su ON m.summary = su.ROWID
-    WHERE m.${threadCol} = ${tid}
+    WHERE m.${threadCol} IN (${placeholders})
       AND m.deleted = 0
-    ORDER BY m.date_received ASC;
+    ORDER BY m.${threadCol}, m.date_received ASC;
   `,
+    tids,
   );
+  for (const row of rows) {
+    const messages = messagesByThread.get(row.thread_id) ?? [];
+    messages.push(row);
+    messagesByThread.set(row.thread_id, messages);
+  }
+  return messagesByThread;
+}
+
+// Conservative bound-parameter budget per statement: older SQLite builds cap
+// SQLITE_MAX_VARIABLE_NUMBER at 999.
+const SQL_VAR_LIMIT = 900;
+
+/** Split an array into chunks that fit within the bound-parameter budget. */
+function chunked(items, size = SQL_VAR_LIMIT) {
+  const chunks = [];
+  for (let i = 0; i < items.length; i += size) {
+    chunks.push(items.slice(i, i + size));
+  }
+  return chunks;
 }
 
 /** Fetch To and CC recipients for the given message IDs, grouped by message and type. */
 export function fetchRecipients(db, messageIds) {
   if (messageIds.length === 0) return {};
-  const idList = messageIds.join(",");
-  const rows = query(
-    db,
-    `
+  const result = {};
+  for (const chunk of chunked(messageIds)) {
+    const placeholders = chunk.map(() => "?").join(",");
+    const rows = query(
+      db,
+      `
     SELECT
       r.message AS message_id,
       r.type,
@@ -178,16 +260,17 @@ export function fetchRecipients(db, messageIds) {
       COALESCE(a.comment, '') AS name
     FROM recipients r
     LEFT JOIN addresses a ON r.address = a.ROWID
-    WHERE r.message IN (${idList})
+    WHERE r.message IN (${placeholders})
     ORDER BY r.message, r.type, r.position;
   `,
-  );
-  const result = {};
-  for (const r of rows) {
-    if (r.type === 2) continue;
-    result[r.message_id] ??= {};
-    result[r.message_id][r.type] ??= [];
-    result[r.message_id][r.type].push(r);
+      chunk,
+    );
+    for (const r of rows) {
+      if (r.type === 2) continue;
+      result[r.message_id] ??= {};
+      result[r.message_id][r.type] ??= [];
+      result[r.message_id][r.type].push(r);
+    }
   }
   return result;
 }
@@ -195,23 +278,26 @@ export function fetchRecipients(db, messageIds) {
 /** Fetch attachment metadata for the given message IDs, grouped by message. */
 export function fetchAttachments(db, messageIds) {
   if (messageIds.length === 0) return {};
-  const idList = messageIds.join(",");
-  const rows = query(
-    db,
-    `
+  const result = {};
+  for (const chunk of chunked(messageIds)) {
+    const placeholders = chunk.map(() => "?").join(",");
+    const rows = query(
+      db,
+      `
     SELECT a.message AS message_id, a.attachment_id, a.name
     FROM attachments a
-    WHERE a.message IN (${idList})
+    WHERE a.message IN (${placeholders})
     ORDER BY a.message, a.ROWID;
   `,
-  );
-  const result = {};
-  for (const r of rows) {
-    result[r.message_id] ??= [];
-    result[r.message_id].push({
-      attachment_id: r.attachment_id,
-      name: r.name,
-    });
+      chunk,
+    );
+    for (const r of rows) {
+      result[r.message_id] ??= [];
+      result[r.message_id].push({
+        attachment_id: r.attachment_id,
+        name: r.name,
+      });
+    }
   }
   return result;
 }
@@ -248,57 +334,156 @@ function indexAttachmentPath(path, attachmentIndex) {
   }
 }
 
-function indexEmlxPath(path, emlxIndex) {
-  const name = basename(path);
+function indexEmlxPath(path, name, emlxIndex) {
   const msgId = name.split(".")[0];
   if (!/^\d+$/.test(msgId)) return;
   const mid = parseInt(msgId, 10);
   const existing = emlxIndex.get(mid);
-  if (!existing || name.length < basename(existing).length) {
+  // Prefer the full message over a .partial.emlx stub for the same ID.
+  if (
+    !existing ||
+    (basename(existing).includes(".partial.") && !name.includes(".partial."))
+  ) {
     emlxIndex.set(mid, path);
   }
 }
 
-function scanMailFiles(mailDir) {
-  return execFileSync(
-    "find",
-    [
-      mailDir,
-      "(",
-      "-name",
-      "*.emlx",
-      "-o",
-      "-path",
-      "*/Attachments/*",
-      ")",
-      "-type",
-      "f",
-    ],
-    { encoding: "utf-8", timeout: 60000, maxBuffer: 50 * 1024 * 1024 },
-  );
+function walkMailDir(mailDir, emlxIndex, attachmentIndex) {
+  const stack = [mailDir];
+  while (stack.length > 0) {
+    const dir = stack.pop();
+    let entries;
+    try {
+      entries = readdirSync(dir, { withFileTypes: true });
+    } catch {
+      continue; // Unreadable or vanished directory
+    }
+    for (const entry of entries) {
+      const path = join(dir, entry.name);
+      if (entry.isDirectory()) {
+        stack.push(path);
+      } else if (entry.isFile()) {
+        if (path.includes("/Attachments/")) {
+          indexAttachmentPath(path, attachmentIndex);
+        } else if (entry.name.endsWith(".emlx")) {
+          indexEmlxPath(path, entry.name, emlxIndex);
+        }
+      }
+    }
+  }
+}
+
+const INDEX_CACHE_FILE = join(STATE_DIR, "apple_mail_file_index.json");
+const INDEX_CACHE_TTL_MS = 24 * 60 * 60 * 1000;
+
+/**
+ * Load the cached file indexes if they are fresh and cover every message ID
+ * we are about to process. Coverage is the precise invalidation signal: a
+ * newly arrived message has a rowid the stale cache cannot contain, which
+ * forces a rewalk exactly when one is needed. IDs the last walk confirmed
+ * have no .emlx on disk (partial downloads, optimize-storage mailboxes)
+ * are tombstoned as `missing` and count as covered — rewalking cannot
+ * produce them either. The TTL bounds staleness for deletions, store
+ * compactions, and late-arriving downloads, which coverage cannot detect.
+ */
+function loadCachedIndexes(requiredMsgIds) {
+  try {
+    const cache = JSON.parse(readFileSync(INDEX_CACHE_FILE, "utf-8"));
+    if (Date.now() - cache.builtAt > INDEX_CACHE_TTL_MS) return null;
+    const emlxIndex = new Map(
+      Object.entries(cache.emlx).map(([mid, path]) => [
+        parseInt(mid, 10),
+        path,
+      ]),
+    );
+    const missing = new Set(cache.missing ?? []);
+    for (const mid of requiredMsgIds) {
+      if (!emlxIndex.has(mid) && !missing.has(mid)) return null;
+    }
+    return {
+      emlxIndex,
+      attachmentIndex: new Map(Object.entries(cache.attachments)),
+    };
+  } catch {
+    return null; // Missing or corrupt cache
+  }
 }
 
-/** Scan ~/Library/Mail for .emlx and attachment files and build lookup indexes by message ID. */
-export function buildFileIndexes() {
+function saveCachedIndexes(emlxIndex, attachmentIndex, missing) {
+  try {
+    mkdirSync(STATE_DIR, { recursive: true });
+    const tmpPath = `${INDEX_CACHE_FILE}.tmp`;
+    writeFileSync(
+      tmpPath,
+      JSON.stringify({
+        builtAt: Date.now(),
+        emlx: Object.fromEntries(emlxIndex),
+        attachments: Object.fromEntries(attachmentIndex),
+        missing,
+      }),
+    );
+    renameSync(tmpPath, INDEX_CACHE_FILE);
+  } catch {
+    // Cache write failures never fail the sync
+  }
+}
+
+/**
+ * Scan ~/Library/Mail for .emlx and attachment files and build lookup indexes
+ * by message ID. When `requiredMsgIds` is given, a recent on-disk index that
+ * covers all of them is reused instead of rewalking the mail tree.
+ */
+export function buildFileIndexes(requiredMsgIds = null) {
+  if (requiredMsgIds) {
+    const cached = loadCachedIndexes(requiredMsgIds);
+    if (cached) return cached;
+  }
   const mailDir = join(HOME, "Library/Mail");
   const emlxIndex = new Map();
   const attachmentIndex = new Map();
+  walkMailDir(mailDir, emlxIndex, attachmentIndex);
+  // Required IDs the walk could not find are tombstoned so their absence
+  // doesn't re-invalidate the cache on every subsequent sync.
+  const missing = requiredMsgIds
+    ? requiredMsgIds.filter((mid) => !emlxIndex.has(mid))
+    : [];
+  saveCachedIndexes(emlxIndex, attachmentIndex, missing);
+  return { emlxIndex, attachmentIndex };
+}
+
+const THREAD_SIGS_FILE = join(STATE_DIR, "apple_mail_thread_sigs.json");
 
+/**
+ * Build a cheap content signature for a thread from its message rows. Any
+ * new, removed, or re-dated message changes the signature; if it matches
+ * the one recorded at last render, the emlx parsing, attachment copying,
+ * and markdown rendering for the thread can all be skipped.
+ */
+export function threadSignature(messages) {
+  return messages
+    .map((m) => `${m.message_id}:${m.date_received ?? ""}`)
+    .join(",");
+}
+
+/** Load the per-thread signature cache ({tid → signature}). */
+export function loadThreadSigs() {
   try {
-    const output = scanMailFiles(mailDir);
-    for (const path of output.trim().split("\n")) {
-      if (!path) continue;
-      if (path.includes("/Attachments/")) {
-        indexAttachmentPath(path, attachmentIndex);
-      } else if (path.endsWith(".emlx")) {
-        indexEmlxPath(path, emlxIndex);
-      }
-    }
+    return JSON.parse(readFileSync(THREAD_SIGS_FILE, "utf-8"));
   } catch {
-    // Timeout or no results
+    return {}; // Missing or corrupt cache
   }
+}
 
-  return { emlxIndex, attachmentIndex };
+/** Persist the per-thread signature cache. */
+export function saveThreadSigs(sigs) {
+  try {
+    mkdirSync(STATE_DIR, { recursive: true });
+    const tmpPath = `${THREAD_SIGS_FILE}.tmp`;
+    writeFileSync(tmpPath, JSON.stringify(sigs));
+    renameSync(tmpPath, THREAD_SIGS_FILE);
+  } catch {
+    // Cache write failures never fail the sync
+  }
 }
 
 function copySingleAttachment(
@@ -312,7 +497,9 @@ function copySingleAttachment(
   const name = sanitiseAttachmentName(att.name);
   const source = attachmentIndex.get(`${mid}:${att.attachment_id}`);
 
-  if (!source || !existsSync(source)) {
+  // No existsSync pre-check: the copy below reports a vanished source via
+  // its own error path, so probing first just doubles the stat traffic.
+  if (!source) {
     return { name, available: false, path: null };
   }
 
@@ -334,7 +521,10 @@ function copySingleAttachment(
   }
 
   try {
-    copyFileSync(source, destPath);
+    // COPYFILE_FICLONE clones instead of copying on APFS (instant,
+    // no duplicated blocks) and silently falls back to a normal copy
+    // on filesystems without reflink support.
+    copyFileSync(source, destPath, constants.COPYFILE_FICLONE);
     return { name: destName, available: true, path: destPath };
   } catch {
     return { name: destName, available: false, path: null };
@@ -23,7 +23,15 @@ Requires macOS with Mail configured and Full Disk Access granted.`);
   process.exit(0);
 }
 
-import { mkdirSync, writeFileSync } from "node:fs";
+import {
+  existsSync,
+  mkdirSync,
+  readFileSync,
+  readdirSync,
+  renameSync,
+  unlinkSync,
+  writeFileSync,
+} from "node:fs";
 import { join } from "node:path";
 import { parseEmlx } from "./parse-emlx.mjs";
 import {
@@ -37,11 +45,14 @@ import {
   unixToReadable,
   discoverThreadColumn,
   findChangedThreads,
-  fetchThreadMessages,
+  fetchAllThreadMessages,
   fetchRecipients,
   fetchAttachments,
   buildFileIndexes,
   copyThreadAttachments,
+  threadSignature,
+  loadThreadSigs,
+  saveThreadSigs,
 } from "./sync-helpers.mjs";
 
 function formatRecipient(r) {
@@ -69,83 +80,92 @@ function parseEmlxBody(messageId, emlxIndex) {
 }
 
 function formatMessageHeader(msg, recipientsByMsg) {
-  const lines = [];
-  lines.push(`### From: ${formatSender(msg)}`);
-  lines.push(`**Date:** ${unixToReadable(msg.date_received)}`);
+  let header = `### From: ${formatSender(msg)}\n**Date:** ${unixToReadable(msg.date_received)}`;
 
-  const mid = msg.message_id;
-  const msgRecips = recipientsByMsg[mid] ?? {};
+  const msgRecips = recipientsByMsg[msg.message_id] ?? {};
   const toList = msgRecips[0] ?? [];
   const ccList = msgRecips[1] ?? [];
   if (toList.length > 0)
-    lines.push(`**To:** ${toList.map(formatRecipient).join(", ")}`);
+    header += `\n**To:** ${toList.map(formatRecipient).join(", ")}`;
   if (ccList.length > 0)
-    lines.push(`**Cc:** ${ccList.map(formatRecipient).join(", ")}`);
-  return lines;
+    header += `\n**Cc:** ${ccList.map(formatRecipient).join(", ")}`;
+  return header;
 }
 
 function formatMessageAttachments(mid, threadId, attachmentResults) {
-  if (!attachmentResults) return [];
+  if (!attachmentResults) return "";
   const msgAtts = attachmentResults[mid] ?? [];
-  if (msgAtts.length === 0) return [];
-  const lines = ["**Attachments:**"];
-  for (const att of msgAtts) {
-    if (att.available) {
-      lines.push(`- [${att.name}](attachments/${threadId}/${att.name})`);
-    } else {
-      lines.push(`- ${att.name} *(not available)*`);
-    }
-  }
-  return lines;
+  if (msgAtts.length === 0) return "";
+  const items = msgAtts.map((att) =>
+    att.available
+      ? `- [${att.name}](attachments/${threadId}/${att.name})`
+      : `- ${att.name} *(not available)*`,
+  );
+  return `**Attachments:**\n${items.join("\n")}`;
 }
 
-function writeThreadMarkdown(
+function renderThreadMarkdown(
   threadId,
   messages,
   recipientsByMsg,
   emlxIndex,
   attachmentResults,
 ) {
-  if (messages.length === 0) return false;
+  if (messages.length === 0) return null;
 
   const baseSubject = messages[0].subject ?? "(No Subject)";
-  const isMailingList = messages.some((m) => (m.list_id_hash ?? 0) !== 0);
-  const isAutomated = messages.some(
-    (m) => (m.automated_conversation ?? 0) !== 0,
-  );
+  let isMailingList = false;
+  let isAutomated = false;
+  for (const m of messages) {
+    if ((m.list_id_hash ?? 0) !== 0) isMailingList = true;
+    if ((m.automated_conversation ?? 0) !== 0) isAutomated = true;
+    if (isMailingList && isAutomated) break;
+  }
 
   const flags = [];
   if (isMailingList) flags.push("mailing-list");
   if (isAutomated) flags.push("automated");
 
-  const lines = [];
-  lines.push(`# ${baseSubject}`);
-  lines.push("");
-  lines.push(`**Thread ID:** ${threadId}`);
-  lines.push(`**Message Count:** ${messages.length}`);
-  if (flags.length > 0) lines.push(`**Flags:** ${flags.join(", ")}`);
-  lines.push("");
+  const flagLine = flags.length > 0 ? `**Flags:** ${flags.join(", ")}\n` : "";
+  const blocks = [
+    `# ${baseSubject}\n\n**Thread ID:** ${threadId}\n**Message Count:** ${messages.length}\n${flagLine}`,
+  ];
 
   for (const msg of messages) {
-    lines.push("---");
-    lines.push("");
-    lines.push(...formatMessageHeader(msg, recipientsByMsg));
-    lines.push("");
-
     const mid = msg.message_id;
     let body = parseEmlxBody(mid, emlxIndex);
     if (!body) body = (msg.summary ?? "").trim();
-    if (body) lines.push(body);
-    lines.push("");
+    const bodyBlock = body ? `${body}\n` : "";
 
-    const attLines = formatMessageAttachments(mid, threadId, attachmentResults);
-    if (attLines.length > 0) {
-      lines.push(...attLines);
-      lines.push("");
-    }
+    const atts = formatMessageAttachments(mid, threadId, attachmentResults);
+    const attBlock = atts ? `\n${atts}\n` : "";
+
+    blocks.push(
+      `---\n\n${formatMessageHeader(msg, recipientsByMsg)}\n\n${bodyBlock}${attBlock}`,
+    );
   }
 
-  writeFileSync(join(OUTDIR, `${threadId}.md`), lines.join("\n"));
+  return blocks.join("\n");
+}
+
+/**
+ * Write a rendered thread to the cache dir, skipping the write when the
+ * existing file already matches — re-synced threads with no new content
+ * keep their mtime, so downstream consumers keyed on mtime (entity
+ * extraction state) don't re-process them. Write-then-rename so agents
+ * reading the cache mid-sync never observe a half-written thread file.
+ * @returns {boolean} true if the file was (re)written
+ */
+function writeThreadFile(threadId, content) {
+  const outPath = join(OUTDIR, `${threadId}.md`);
+  try {
+    if (readFileSync(outPath, "utf-8") === content) return false;
+  } catch {
+    // Missing or unreadable — write it
+  }
+  const tmpPath = `${outPath}.tmp`;
+  writeFileSync(tmpPath, content);
+  renameSync(tmpPath, outPath);
   return true;
 }
 
@@ -194,16 +214,30 @@ function main() {
       return;
     }
 
-    const { emlxIndex, attachmentIndex } = buildFileIndexes();
+    const messagesByThread = fetchAllThreadMessages(db, threadCol, threadIds);
+    const allMsgIds = [...messagesByThread.values()].flatMap((messages) =>
+      messages.map((m) => m.message_id),
+    );
+    const recipients = fetchRecipients(db, allMsgIds);
+    const attachmentsByMsg = fetchAttachments(db, allMsgIds);
+    const { emlxIndex, attachmentIndex } = buildFileIndexes(allMsgIds);
 
+    const threadSigs = loadThreadSigs();
     let written = 0;
+    let unchanged = 0;
     for (const tid of threadIds) {
-      const messages = fetchThreadMessages(db, threadCol, tid);
+      const messages = messagesByThread.get(tid) ?? [];
       if (messages.length === 0) continue;
 
-      const msgIds = messages.map((m) => m.message_id);
-      const recipients = fetchRecipients(db, msgIds);
-      const attachmentsByMsg = fetchAttachments(db, msgIds);
+      // A thread whose message set hasn't changed since its last render
+      // produces byte-identical output — skip parsing, attachment copying,
+      // and rendering outright as long as the output file still exists.
+      const sig = threadSignature(messages);
+      if (threadSigs[tid] === sig && existsSync(join(OUTDIR, `${tid}.md`))) {
+        unchanged++;
+        continue;
+      }
+
       const attachmentResults = copyThreadAttachments(
         tid,
         messages,
@@ -211,24 +245,39 @@ function main() {
         attachmentIndex,
       );
 
-      if (
-        writeThreadMarkdown(
-          tid,
-          messages,
-          recipients,
-          emlxIndex,
-          attachmentResults,
-        )
-      ) {
-        written++;
+      const content = renderThreadMarkdown(
+        tid,
+        messages,
+        recipients,
+        emlxIndex,
+        attachmentResults,
+      );
+      if (content !== null) {
+        if (writeThreadFile(tid, content)) written++;
+        else unchanged++;
+        threadSigs[tid] = sig;
       }
     }
 
+    // Prune signatures whose output file is gone (threads aged out of the
+    // window or deleted) so the cache tracks the output dir instead of
+    // growing without bound across months of syncs. The same directory
+    // listing removes .md.tmp leftovers from an interrupted sync — OUTDIR
+    // is an extract-entities source dir, which must never ingest a torn
+    // tmp file as a document.
+    const outputFiles = new Set(readdirSync(OUTDIR));
+    for (const fname of outputFiles) {
+      if (fname.endsWith(".md.tmp")) unlinkSync(join(OUTDIR, fname));
+    }
+    for (const tid of Object.keys(threadSigs)) {
+      if (!outputFiles.has(`${tid}.md`)) delete threadSigs[tid];
+    }
+    saveThreadSigs(threadSigs);
     saveSyncState(maxRowid);
 
     console.log("Apple Mail Sync Complete");
     console.log(`Threads processed: ${threadIds.length}`);
-    console.log(`New/updated files: ${written}`);
+    console.log(`New/updated files: ${written} (${unchanged} unchanged)`);
     console.log(`Time range: ${sinceReadable} to now`);
     console.log(`Output: ${OUTDIR}`);
   } finally {
@@ -0,0 +1,128 @@
+/**
+ * parse-emlx extraction tests.
+ *
+ * Exercises the exported MIME/HTML pipeline against constructed messages:
+ * HTML comment/CDATA stripping, text-part selection (first plain wins,
+ * empty plain falls back to HTML), non-text parts staying undecoded, and
+ * the ranged .emlx reads that exclude the trailing plist.
+ */
+import { test, describe, before, after } from "node:test";
+import assert from "node:assert";
+import { mkdtempSync, rmSync, writeFileSync } from "node:fs";
+import { tmpdir } from "node:os";
+import { join } from "node:path";
+import {
+  htmlToText,
+  extractBody,
+  parseEmlx,
+} from "../templates/.claude/skills/sync-apple-mail/scripts/parse-emlx.mjs";
+
+const BOUNDARY = "test-boundary";
+
+function textPart(type, body, headers = []) {
+  return [`Content-Type: ${type}; charset=utf-8`, ...headers, "", body];
+}
+
+function multipart(...parts) {
+  const lines = [
+    `Content-Type: multipart/alternative; boundary="${BOUNDARY}"`,
+    "",
+  ];
+  for (const part of parts) {
+    lines.push(`--${BOUNDARY}`, ...part);
+  }
+  lines.push(`--${BOUNDARY}--`, "");
+  return Buffer.from(lines.join("\n"));
+}
+
+describe("htmlToText", () => {
+  test("strips comments and CDATA sections", () => {
+    const html =
+      "<p>before</p><!-- hidden <b>markup</b> --><![CDATA[raw <junk>]]>after";
+    assert.strictEqual(htmlToText(html), "before\nafter");
+  });
+
+  test("strips style and script blocks and decodes entities", () => {
+    const html = "<style>p { color: red }</style><p>a &amp; b</p>";
+    assert.strictEqual(htmlToText(html), "a & b");
+  });
+});
+
+describe("extractBody part selection", () => {
+  test("first text/plain part wins over later parts", () => {
+    const raw = multipart(
+      textPart("text/plain", "first plain"),
+      textPart("text/plain", "second plain"),
+      textPart("text/html", "<p>html version</p>"),
+    );
+    assert.strictEqual(extractBody(raw), "first plain");
+  });
+
+  test("empty text/plain falls back to the HTML part", () => {
+    const raw = multipart(
+      textPart("text/plain", ""),
+      textPart("text/html", "<p>html version</p>"),
+    );
+    assert.strictEqual(extractBody(raw), "html version");
+  });
+
+  test("base64 attachment parts are skipped, not decoded", () => {
+    // The attachment payload is not valid base64; if the walk ever decoded
+    // non-text parts this would at minimum waste the work, so assert the
+    // plain body comes through untouched and an attachment-only message
+    // yields no body at all.
+    const attachment = [
+      "Content-Type: application/pdf",
+      "Content-Transfer-Encoding: base64",
+      "",
+      "!!not-base64!!",
+    ];
+    const withBody = multipart(attachment, textPart("text/plain", "the body"));
+    assert.strictEqual(extractBody(withBody), "the body");
+    assert.strictEqual(extractBody(multipart(attachment)), null);
+  });
+});
+
+describe("parseEmlx ranged reads", () => {
+  let tmpRoot;
+
+  before(() => {
+    tmpRoot = mkdtempSync(join(tmpdir(), "outpost-emlx-"));
+  });
+
+  after(() => {
+    rmSync(tmpRoot, { recursive: true, force: true });
+  });
+
+  function writeEmlx(name, contents) {
+    const p = join(tmpRoot, name);
+    writeFileSync(p, contents);
+    return p;
+  }
+
+  function emlxFile(name, payload) {
+    const trailer = Buffer.from("<plist>should never appear</plist>");
+    return writeEmlx(
+      name,
+      Buffer.concat([Buffer.from(`${payload.length}\n`), payload, trailer]),
+    );
+  }
+
+  test("reads exactly the counted message, excluding the plist", () => {
+    const payload = Buffer.from("Content-Type: text/plain\n\nBody here\n");
+    const p = emlxFile("normal.emlx", payload);
+    assert.strictEqual(parseEmlx(p), "Body here\n");
+  });
+
+  test("garbage byte count yields null", () => {
+    const p = writeEmlx("garbage.emlx", "notanumber\nContent: stuff\n");
+    assert.strictEqual(parseEmlx(p), null);
+  });
+
+  test("truncated file yields the short body that is present", () => {
+    const payload = Buffer.from("Content-Type: text/plain\n\nBody here\n");
+    const full = Buffer.concat([Buffer.from(`${payload.length}\n`), payload]);
+    const p = writeEmlx("truncated.emlx", full.subarray(0, full.length - 6));
+    assert.strictEqual(parseEmlx(p), "Body");
+  });
+});
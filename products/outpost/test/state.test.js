@@ -0,0 +1,113 @@
+/**
+ * graph_processed state lifecycle tests.
+ *
+ * Injects temp source dirs and a temp state file via the dedicated DI
+ * parameters — no HOME override (bun's `os.homedir()` ignores
+ * `process.env.HOME` and reads `getpwuid()` directly, so DI is the only
+ * correct isolation channel under `bun test`). Covers the check/update
+ * cycle: new-file reporting, the size+mtime stat shortcut, unchanged
+ * content under a touched mtime, and legacy two-column entry migration.
+ */
+import { test, describe, beforeEach, afterEach } from "node:test";
+import assert from "node:assert";
+import { createHash } from "node:crypto";
+import {
+  mkdirSync,
+  mkdtempSync,
+  readFileSync,
+  rmSync,
+  utimesSync,
+  writeFileSync,
+} from "node:fs";
+import { tmpdir } from "node:os";
+import { join } from "node:path";
+import {
+  check,
+  update,
+} from "../templates/.claude/skills/extract-entities/scripts/state.mjs";
+
+describe("graph_processed state lifecycle", () => {
+  let tmpRoot;
+  let sourceDir;
+  let stateFile;
+
+  beforeEach(() => {
+    tmpRoot = mkdtempSync(join(tmpdir(), "outpost-state-"));
+    sourceDir = join(tmpRoot, "apple_mail");
+    stateFile = join(tmpRoot, "state", "graph_processed");
+    mkdirSync(sourceDir, { recursive: true });
+  });
+
+  afterEach(() => {
+    rmSync(tmpRoot, { recursive: true, force: true });
+  });
+
+  function writeSource(name, content) {
+    const p = join(sourceDir, name);
+    writeFileSync(p, content);
+    return p;
+  }
+
+  function blake2bTag(content) {
+    const hex = createHash("blake2b512").update(content).digest("hex");
+    return `blake2b512:${hex}`;
+  }
+
+  test("new files are reported sorted", () => {
+    const b = writeSource("b.md", "beta");
+    const a = writeSource("a.md", "alpha");
+    assert.deepStrictEqual(check([sourceDir], stateFile), [a, b]);
+  });
+
+  test("update clears files from the changed set", () => {
+    const a = writeSource("a.md", "alpha");
+    update([a], stateFile);
+    assert.deepStrictEqual(check([sourceDir], stateFile), []);
+  });
+
+  test("matching size+mtime skips hashing entirely", () => {
+    const a = writeSource("a.md", "alpha");
+    update([a], stateFile);
+    // Corrupt the stored hash but keep the stat columns. The shortcut must
+    // skip the hash comparison, so the file still reads as unchanged.
+    const corrupted = readFileSync(stateFile, "utf-8").replace(
+      /blake2b512:[0-9a-f]+/,
+      "blake2b512:deadbeef",
+    );
+    writeFileSync(stateFile, corrupted);
+    assert.deepStrictEqual(check([sourceDir], stateFile), []);
+  });
+
+  test("touched mtime with unchanged content is not re-reported", () => {
+    const a = writeSource("a.md", "alpha");
+    update([a], stateFile);
+    const later = new Date(Date.now() + 5000);
+    utimesSync(a, later, later);
+    assert.deepStrictEqual(check([sourceDir], stateFile), []);
+  });
+
+  test("changed content is re-reported", () => {
+    const a = writeSource("a.md", "alpha");
+    update([a], stateFile);
+    writeSource("a.md", "gamma");
+    assert.deepStrictEqual(check([sourceDir], stateFile), [a]);
+  });
+
+  test("legacy entries compare by hash and migrate on update", () => {
+    const a = writeSource("a.md", "alpha");
+    mkdirSync(join(tmpRoot, "state"), { recursive: true });
+    writeFileSync(stateFile, `${a}\t${blake2bTag("alpha")}\n`);
+    // No stat columns, so the legacy entry falls through to the hash
+    // comparison — which matches, so the file is not reported.
+    assert.deepStrictEqual(check([sourceDir], stateFile), []);
+    update([a], stateFile);
+    const line = readFileSync(stateFile, "utf-8").trimEnd();
+    assert.strictEqual(line.split("\t").length, 4);
+    assert.ok(line.endsWith(blake2bTag("alpha")));
+  });
+
+  test("missing update target warns without creating an entry", () => {
+    update([join(sourceDir, "ghost.md")], stateFile);
+    assert.strictEqual(readFileSync(stateFile, "utf-8"), "");
+  });
+});